@@ -1,11 +1,24 @@
+import math
 import random
 import time
 import serial
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.animation import FuncAnimation
-from collections import deque
 import sys
+import threading
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; fall back to plain Python
+    njit = None
+
+# Numba can't compile functions from the Cython build (see setup.py)
+if njit is None or not __file__.endswith('.py'):
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
 
 # Child-friendly pH classification
 PH_LEVELS = {
@@ -66,43 +79,125 @@ PH_LEVELS = {
     },
 }
 
+# PH_LEVELS flattened into per-field tables indexed by category id
+_PH_NAMES = list(PH_LEVELS)
+_PH_COLORS = [data["color"] for data in PH_LEVELS.values()]
+_PH_EMOJIS = [data["emoji"] for data in PH_LEVELS.values()]
+_PH_ADVICE = [tuple(data["advice"]) for data in PH_LEVELS.values()]
+_PH_EDGES = np.array([data["range"][1] for data in PH_LEVELS.values()], dtype=np.float64)
+_RAINBOW_IDX = _PH_NAMES.index("Perfect Rainbow! 🌈")
+
+def _build_classifier():
+    """Generate a straight if-cascade over _PH_EDGES returning the category index"""
+    lines = ["def _classify(ph):"]
+    for idx, edge in enumerate(_PH_EDGES[:-1]):
+        lines.append(f"    if ph < {float(edge)!r}: return {idx}")
+    lines.append(f"    return {len(_PH_EDGES) - 1}")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["_classify"]
+
+_classify = _build_classifier()
+
+@njit(cache=True)
+def _update_score(cat_idx, prev_score):
+    """Return the health score after a reading in the given category"""
+    is_rainbow = cat_idx == _RAINBOW_IDX
+    return min(100, max(0, prev_score + 2 * is_rainbow - 1))
+
 class RealSalivaMonitor:
+    SENSOR_POLL_INTERVAL = 0.5  # Seconds between background sensor reads
+    HISTORY_LEN = 50  # Readings kept for the pH plot
+    _INV_30 = 1.0 / 30.0  # Period scale for the simulated pH drift
+    _RNG_BATCH = 4096  # Simulator samples drawn per refill; must be a power of two
+    _STAR_CACHE = tuple('⭐' * i for i in range(6))
+
     def __init__(self, serial_port='/dev/ttyUSB0', baud_rate=9600):
         # Initialize serial connection to sensor
         self.serial_port = serial_port
         self.baud_rate = baud_rate
         self.ser = None
+        self.sensor_errors = 0
+        self._latest_ph = None  # Written by the background serial thread
+        self._serial_lock = threading.Lock()
         self.connect_to_sensor()
         
         # Initialize data storage
-        self.time_data = deque(maxlen=50)  # Store last 50 readings
-        self.ph_data = deque(maxlen=50)
+        # Ring buffer of the last HISTORY_LEN (time, pH) readings
+        self._ring = np.empty((self.HISTORY_LEN, 2), dtype=np.float64)
+        self._ring_order = np.arange(self.HISTORY_LEN)
+        self._head = 0
+        self._count = 0
         self.start_time = time.time()
-        self.last_reading_time = time.time()
+        self.last_reading_time = self.start_time
+        self._last_xlim_shift = 0.0
+        
+        # Pre-drawn random numbers for the simulator, refilled on wrap
+        self._rng = np.random.default_rng()
+        self._noise = (self._rng.standard_normal(self._RNG_BATCH) * 0.2).tolist()
+        self._noise_i = 0
+        self._uniforms = self._rng.random(self._RNG_BATCH).tolist()
+        self._uniform_i = 0
         
         # Setup plot
-        self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(10, 8))
+        # Cheaper line rendering for the animated plot (note: a global matplotlib setting)
+        plt.rcParams['path.simplify_threshold'] = 1.0
+        self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(8, 6), dpi=72)
         self.fig.suptitle("REAL-TIME SALIVA HEALTH MONITOR", fontsize=16, 
                          color='#FF6B8B', fontweight='bold')
         
         # Initialize plot elements
-        self.line, = self.ax1.plot([], [], 'o-', color='royalblue', markersize=6)
-        self.current_marker = self.ax1.scatter([], [], s=200)
+        # Artists updated every frame are animated so they can be blitted
+        self.line, = self.ax1.plot([], [], 'o-', color='royalblue', markersize=6,
+                                   animated=True)
+        self.current_marker = self.ax1.scatter([0], [0], s=200, edgecolors='black',
+                                               zorder=3, animated=True)
+        # Top-anchored so the box stays inside ax1, the region blitting restores
         self.status_text = self.ax1.text(0.02, 0.95, '', transform=self.ax1.transAxes,
-                                        fontsize=12, bbox=dict(facecolor='white', alpha=0.8))
+                                        fontsize=12, va='top',
+                                        bbox=dict(facecolor='white', alpha=0.8),
+                                        animated=True)
         self.advice_text = self.ax2.text(0.5, 0.5, 'Initializing...', 
-                                        ha='center', va='center', fontsize=14, wrap=True)
+                                        ha='center', va='center', fontsize=14, wrap=True,
+                                        animated=True)
+        # Small pool of reusable change annotations; the oldest is recycled.
+        # Right-aligned and clipped so they stay inside ax1, the region blitting restores
+        self._ann_pool = [
+            self.ax1.text(0, 0, '', fontsize=10, ha='right', visible=False, animated=True,
+                          clip_on=True, bbox=dict(facecolor='white', alpha=0.7))
+            for _ in range(4)
+        ]
+        self._ann_i = 0
+        
+        # Pre-bound artist setters used on every frame
+        self._set_data = self.line.set_data
+        self._set_status = self.status_text.set_text
+        self._set_advice = self.advice_text.set_text
+        self._set_advice_color = self.advice_text.set_color
+        self._set_marker_offsets = self.current_marker.set_offsets
+        self._set_marker_color = self.current_marker.set_facecolor
         
         # Configure plots
         self.configure_plots()
         
         # Initialize variables
         self.last_reading = None
-        self.last_category = None
+        self.last_category_idx = -1
         self.consecutive_count = 0
         self.health_score = 100
         self.stars = 0
-        self.sensor_errors = 0
+        self._last_status_key = None
+
+    def _push(self, t, ph):
+        """Store a reading in the ring buffer, overwriting the oldest"""
+        self._ring[self._head] = (t, ph)
+        self._head = (self._head + 1) % self.HISTORY_LEN
+        self._count = min(self._count + 1, self.HISTORY_LEN)
+
+    def _history(self):
+        """Return buffered readings in chronological order"""
+        idx = (self._head - self._count + self._ring_order[:self._count]) % self.HISTORY_LEN
+        return self._ring[idx]
 
     def connect_to_sensor(self):
         """Connect to pH sensor with error handling"""
@@ -110,6 +205,7 @@ class RealSalivaMonitor:
             self.ser = serial.Serial(self.serial_port, self.baud_rate, timeout=1)
             time.sleep(2)  # Allow connection to establish
             print(f"✅ Connected to sensor at {self.serial_port}")
+            threading.Thread(target=self._serial_loop, daemon=True).start()
             return True
         except (serial.SerialException, OSError) as e:
             print(f"❌ Sensor connection failed: {e}")
@@ -125,6 +221,7 @@ class RealSalivaMonitor:
         self.ax1.set_ylabel("pH Level", fontsize=10)
         self.ax1.set_ylim(4.0, 9.0)
         self.ax1.set_xlim(0, 60)  # Show last 60 seconds
+        self.ax1.set_autoscale_on(False)
         self.ax1.grid(True, linestyle='--', alpha=0.3)
         
         # Add healthy zone
@@ -142,51 +239,83 @@ class RealSalivaMonitor:
                                        linewidth=2, alpha=0.8)
         self.ax2.add_patch(self.advice_box)
         
-    def read_sensor(self):
-        """Read actual pH value from hardware sensor"""
-        # If we don't have a real sensor, use simulation
-        if self.ser is None or not self.ser.is_open:
-            return self.simulate_sensor_data()
-        
-        try:
-            # Read from sensor
-            self.ser.write(b'R')  # Send request for data
-            response = self.ser.readline().decode('utf-8').strip()
-            
-            if response:
-                return float(response)
-            else:
-                raise ValueError("Empty response from sensor")
+    def _serial_loop(self):
+        """Poll the hardware sensor in the background so the GUI never blocks"""
+        ser = self.ser
+        while ser is not None and ser.is_open:
+            try:
+                with self._serial_lock:
+                    ser.write(b'R')  # Send request for data
+                    response = ser.readline()
                 
-        except (ValueError, serial.SerialException, UnicodeDecodeError) as e:
-            self.sensor_errors += 1
-            print(f"⚠️ Sensor error ({self.sensor_errors}/3): {e}")
+                # float() parses bytes directly and ignores surrounding whitespace
+                if response:
+                    self._latest_ph = float(response)
+                else:
+                    raise ValueError("Empty response from sensor")
+                    
+            except (ValueError, serial.SerialException) as e:
+                self._log_error(e)
+                if self.ser is None:
+                    return
             
-            # After 3 errors, switch to simulation
-            if self.sensor_errors >= 3:
-                print("🔁 Switching to simulated data")
-                self.ser = None
-                
-            return self.simulate_sensor_data()
+            time.sleep(self.SENSOR_POLL_INTERVAL)
+
+    def _log_error(self, e):
+        """Report a sensor error, switching to simulation after 3"""
+        self.sensor_errors += 1
+        print(f"⚠️ Sensor error ({self.sensor_errors}/3): {e}")
+        
+        # After 3 errors, switch to simulation
+        if self.sensor_errors >= 3:
+            print("🔁 Switching to simulated data")
+            with self._serial_lock:
+                ser, self.ser = self.ser, None
+                if ser is not None:
+                    ser.close()
+
+    def read_sensor(self, now):
+        """Return the latest pH value from the hardware sensor"""
+        # If we don't have a real sensor (or no reading yet), use simulation.
+        # Read the handle once: the polling thread may drop it at any time
+        ser = self.ser
+        if ser is None or not ser.is_open or self._latest_ph is None:
+            return self.simulate_sensor_data(now)
+        return self._latest_ph
     
-    def simulate_sensor_data(self):
+    def _next_noise(self):
+        """Return the next buffered gaussian sample (sigma 0.2)"""
+        f = self._noise[self._noise_i]
+        self._noise_i = (self._noise_i + 1) & (self._RNG_BATCH - 1)
+        if self._noise_i == 0:
+            self._noise = (self._rng.standard_normal(self._RNG_BATCH) * 0.2).tolist()
+        return f
+
+    def _next_uniform(self):
+        """Return the next buffered uniform sample in [0, 1)"""
+        u = self._uniforms[self._uniform_i]
+        self._uniform_i = (self._uniform_i + 1) & (self._RNG_BATCH - 1)
+        if self._uniform_i == 0:
+            self._uniforms = self._rng.random(self._RNG_BATCH).tolist()
+        return u
+
+    def simulate_sensor_data(self, now):
         """Generate simulated data when real sensor fails"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_reading_time
+        time_since_last = now - self.last_reading_time
         
         # Base value with slow drift
-        base = 6.5 + 0.5 * np.sin(current_time / 30)
+        base = 6.5 + 0.5 * math.sin(now * self._INV_30)
         
         # Add random fluctuations
-        fluctuation = random.gauss(0, 0.2)
+        fluctuation = self._next_noise()
         
         # Simulate events based on time
-        if time_since_last > 20 and random.random() < 0.1:
+        if time_since_last > 20 and self._next_uniform() < 0.1:
             # Simulate sugary drink (lowers pH)
-            fluctuation -= random.uniform(1.0, 2.0)
-        elif time_since_last > 40 and random.random() < 0.1:
+            fluctuation -= 1.0 + self._next_uniform()
+        elif time_since_last > 40 and self._next_uniform() < 0.1:
             # Simulate healthy snack (raises pH)
-            fluctuation += random.uniform(0.5, 1.0)
+            fluctuation += 0.5 + 0.5 * self._next_uniform()
         
         ph = base + fluctuation
         
@@ -199,19 +328,22 @@ class RealSalivaMonitor:
         print("Starting calibration...")
         self.advice_text.set_text("Calibrating sensor... Please wait")
         
-        # Only calibrate if we have a real sensor
-        if self.ser and self.ser.is_open:
-            try:
-                # Send calibration command to sensor
-                self.ser.write(b'CALIBRATE')
-                
-                # Wait for calibration to complete
-                time.sleep(3)
-                print("✅ Calibration complete!")
-                self.advice_text.set_text("Calibration complete! Ready to monitor")
-                return
-            except serial.SerialException:
-                print("⚠️ Calibration failed")
+        # Only calibrate if we have a real sensor. Hold the port so background
+        # polling can neither interrupt calibration nor drop the sensor mid-write
+        with self._serial_lock:
+            ser = self.ser
+            if ser is not None and ser.is_open:
+                try:
+                    # Send calibration command to sensor
+                    ser.write(b'CALIBRATE')
+                    
+                    # Wait for calibration to complete
+                    time.sleep(3)
+                    print("✅ Calibration complete!")
+                    self.advice_text.set_text("Calibration complete! Ready to monitor")
+                    return
+                except serial.SerialException:
+                    print("⚠️ Calibration failed")
         
         # Simulate calibration
         print("🔁 Simulating calibration")
@@ -220,94 +352,90 @@ class RealSalivaMonitor:
         self.advice_text.set_text("Simulated calibration complete")
 
     def classify_ph(self, ph):
-        """Categorize pH reading with child-friendly terms"""
-        for name, data in PH_LEVELS.items():
-            if data["range"][0] <= ph < data["range"][1]:
-                return name, data
-        return "Unknown", None
+        """Categorize pH reading, returning an index into the _PH_* tables"""
+        return _classify(ph)
     
     def update_display(self, frame):
         """Update the display with new sensor data"""
-        try:
-            # Get sensor reading
-            ph = self.read_sensor()
-            current_time = time.time() - self.start_time
-            
-            # Add to data
-            self.time_data.append(current_time)
-            self.ph_data.append(ph)
-            
-            # Update plot
-            self.line.set_data(self.time_data, self.ph_data)
-            
-            # Adjust x-axis to show most recent minute
-            if current_time > 60:
-                self.ax1.set_xlim(current_time - 60, current_time)
-            
-            # Classify pH
-            category, data = self.classify_ph(ph)
-            
-            # Update health score
-            if "Rainbow" in category:
-                self.health_score = min(100, self.health_score + 1)
-            else:
-                self.health_score = max(0, self.health_score - 1)
-                
-            # Award stars for healthy readings
-            if "Rainbow" in category and (time.time() - self.last_reading_time) > 5:
-                self.stars += 1
-                self.last_reading_time = time.time()
-            
-            # Check if category changed
-            if category == self.last_category:
-                self.consecutive_count += 1
-            else:
-                self.consecutive_count = 1
-                self.last_category = category
+        # Get sensor reading
+        now = time.time()
+        ph = self.read_sensor(now)
+        current_time = now - self.start_time
+        
+        # Add to data
+        self._push(current_time, ph)
+        
+        # Update plot
+        view = self._history()
+        self._set_data(view[:, 0], view[:, 1])
+        
+        # Adjust x-axis to show most recent minute
+        # in 5 second steps, leaving room for the next 5 seconds of data
+        if current_time > 60 and current_time - self._last_xlim_shift > 5.0:
+            self._last_xlim_shift = current_time
+            self.ax1.set_xlim(current_time - 55, current_time + 5)
+            # Redraw now so the blit background is cached with the new ticks
+            self.fig.canvas.draw()
+        
+        # Classify pH and update health score
+        cat_idx = self.classify_ph(ph)
+        is_rainbow = cat_idx == _RAINBOW_IDX
+        self.health_score = _update_score(cat_idx, self.health_score)
+        category = _PH_NAMES[cat_idx]
+        color = _PH_COLORS[cat_idx]
             
-            # Update status display
-            status = (f"pH: {ph:.2f} {data['emoji']}\n"
+        # Award stars for healthy readings
+        if is_rainbow and (now - self.last_reading_time) > 5:
+            self.stars += 1
+            self.last_reading_time = now
+        
+        # Check if category changed
+        if cat_idx != self.last_category_idx:
+            self.consecutive_count = 1
+            self.last_category_idx = cat_idx
+        else:
+            self.consecutive_count += 1
+        
+        # Update status display, only when something shown has changed
+        status_key = (round(ph, 2), cat_idx, self.health_score, self.stars)
+        if status_key != self._last_status_key:
+            self._last_status_key = status_key
+            status = (f"pH: {ph:.2f} {_PH_EMOJIS[cat_idx]}\n"
                      f"Status: {category}\n"
-                     f"Health Score: {self.health_score} | Stars: {'⭐' * min(5, self.stars)}")
-            self.status_text.set_text(status)
-            
-            # Provide advice
-            if self.consecutive_count >= 3:
-                advice = random.choice(data['advice'])
-                self.advice_text.set_text(advice)
-                self.advice_text.set_color(data['color'])
-            else:
-                self.advice_text.set_text("Monitoring saliva health...")
-                self.advice_text.set_color('black')
-            
-            # Update current marker
-            if hasattr(self, 'current_marker'):
-                self.current_marker.remove()
-            self.current_marker = self.ax1.scatter(
-                [current_time], [ph], s=200, c=data['color'], 
-                edgecolors='black', zorder=3
-            )
-            
-            # Add text annotation for significant changes (with None check)
-            if (self.last_reading is not None and 
-                abs(ph - self.last_reading) > 0.5 and 
-                (current_time - self.last_reading_time) > 5):
-                change = "↑↑" if ph > self.last_reading else "↓↓"
-                self.ax1.text(
-                    current_time, ph + 0.3, 
-                    f"{change} {abs(ph - self.last_reading):.1f} change!",
-                    fontsize=10, bbox=dict(facecolor='white', alpha=0.7)
-                )
-                self.last_reading = ph
-            elif self.last_reading is None:
-                self.last_reading = ph
-                
-            return self.line, self.status_text, self.advice_text, self.current_marker
+                     f"Health Score: {self.health_score} | "
+                     f"Stars: {self._STAR_CACHE[min(5, self.stars)]}")
+            self._set_status(status)
+        
+        # Provide advice
+        if self.consecutive_count >= 3:
+            advice = random.choice(_PH_ADVICE[cat_idx])
+            self._set_advice(advice)
+            self._set_advice_color(color)
+        else:
+            self._set_advice("Monitoring saliva health...")
+            self._set_advice_color('black')
+        
+        # Update current marker
+        self._set_marker_offsets([[current_time, ph]])
+        self._set_marker_color(color)
         
-        except Exception as e:
-            print(f"⚠️ Critical error in update: {e}")
-            # Return existing artists to keep animation alive
-            return self.line, self.status_text, self.advice_text, self.current_marker
+        # Add text annotation for significant changes (with None check)
+        if (self.last_reading is not None and 
+            abs(ph - self.last_reading) > 0.5 and 
+            (now - self.last_reading_time) > 5):
+            change = "↑↑" if ph > self.last_reading else "↓↓"
+            annotation = self._ann_pool[self._ann_i]
+            # Keep the label below the top of the pH axis
+            annotation.set_position((current_time, min(ph + 0.3, self.ax1.get_ylim()[1] - 0.7)))
+            annotation.set_text(f"{change} {abs(ph - self.last_reading):.1f} change!")
+            annotation.set_visible(True)
+            self._ann_i = (self._ann_i + 1) % len(self._ann_pool)
+            self.last_reading = ph
+        elif self.last_reading is None:
+            self.last_reading = ph
+            
+        return (self.line, self.status_text, self.advice_text, self.current_marker,
+                *self._ann_pool)
     
     def start_monitoring(self):
         """Start the real-time monitoring"""
@@ -316,9 +444,10 @@ class RealSalivaMonitor:
         print("="*60)
         
         print("Hardware Status:")
-        if self.ser and self.ser.is_open:
-            print(f"- Connected to sensor at {self.ser.port}")
-            print(f"- Baud rate: {self.ser.baudrate}")
+        ser = self.ser
+        if ser and ser.is_open:
+            print(f"- Connected to sensor at {ser.port}")
+            print(f"- Baud rate: {ser.baudrate}")
         else:
             print("- Using simulated data")
         print("="*60)
@@ -334,7 +463,7 @@ class RealSalivaMonitor:
             self.fig, 
             self.update_display, 
             interval=2000,  # Update every 2 seconds
-            blit=False
+            blit=True
         )
         
         plt.tight_layout()
@@ -343,12 +472,17 @@ class RealSalivaMonitor:
 
     def __del__(self):
         """Clean up serial connection"""
-        if hasattr(self, 'ser') and self.ser and self.ser.is_open:
-            self.ser.close()
-            print("✅ Serial connection closed")
+        # __init__ may have failed before the lock was created
+        if not hasattr(self, '_serial_lock'):
+            return
+        with self._serial_lock:
+            ser, self.ser = self.ser, None
+            if ser is not None and ser.is_open:
+                ser.close()
+                print("✅ Serial connection closed")
 
-# Start the monitoring system
-if __name__ == "__main__":
+def main():
+    """Start the monitoring system"""
     # Configure these based on your hardware setup
     SERIAL_PORT = '/dev/ttyUSB0'  # Change to your port (COM3 on Windows)
     BAUD_RATE = 9600
@@ -374,4 +508,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\n❌ Critical error: {e}")
         print("Please check your setup and try again")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
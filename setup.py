@@ -0,0 +1,12 @@
+"""Optional ahead-of-time build of childhealth.py with Cython.
+
+    python setup.py build_ext --inplace
+    python -c "import childhealth; childhealth.main()"
+"""
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="childhealth",
+    ext_modules=cythonize("childhealth.py", compiler_directives={"language_level": 3}),
+)